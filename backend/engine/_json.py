@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from typing import Any
+
+import orjson
+
+from ._json_repair import repair_json
+
+
+# Fast JSON for the hot compress/retrieve paths. Output is compact UTF-8 (the
+# orjson equivalent of json.dumps(..., ensure_ascii=False) without spaces).
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+def loads(data: str | bytes) -> Any:
+    return orjson.loads(data)
+
+
+def loads_loose(text: str) -> Any:
+    # For LLM replies: strict parse first, then the single-pass repair (strips chatter
+    # and ``` fences, fixes trailing commas and truncation).
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return orjson.loads(repair_json(text))
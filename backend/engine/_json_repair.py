@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import re
+
+
+# Single-pass, stack-based repair for LLM JSON output. Handles:
+# - chatter before/after the JSON value ("Here's your JSON:", ``` fences)
+# - trailing commas before a closing bracket
+# - truncated output (unterminated strings, dangling keys/commas/colons,
+#   partial literals, unclosed brackets)
+
+# Character classes for the structural scan (ASCII only; everything else is class 0).
+_WS = 1
+_QUOTE = 2
+_OPEN = 4
+_CLOSE = 8
+
+_CLASS = [0] * 128
+for _c in " \t\r\n":
+    _CLASS[ord(_c)] = _WS
+_CLASS[ord('"')] = _QUOTE
+for _c in "{[":
+    _CLASS[ord(_c)] = _OPEN
+for _c in "}]":
+    _CLASS[ord(_c)] = _CLOSE
+
+_CLOSER = {"{": "}", "[": "]"}
+_LITERALS = ("true", "false", "null")
+_PARTIAL_TOKEN_RE = re.compile(r"[A-Za-z0-9.+\-]+$")
+
+
+def _cls(ch: str) -> int:
+    o = ord(ch)
+    return _CLASS[o] if o < 128 else 0
+
+
+def _rstrip(out: list[str]) -> None:
+    while out and _cls(out[-1]) & _WS:
+        out.pop()
+
+
+def _last_significant(out: list[str], end: int) -> str:
+    i = end - 1
+    while i >= 0 and _cls(out[i]) & _WS:
+        i -= 1
+    return out[i] if i >= 0 else ""
+
+
+def _complete_tail(out: list[str], stack: list[str], str_start: int) -> None:
+    # Fix up whatever was being written when the input ended.
+    _rstrip(out)
+    tail = "".join(out[-8:])
+    m = _PARTIAL_TOKEN_RE.search(tail)
+    if m and not tail.endswith('"'):
+        token = m.group(0)
+        lit = next((lit for lit in _LITERALS if lit.startswith(token)), None)
+        if lit is not None:
+            out.extend(lit[len(token):])
+        else:
+            while out and out[-1] in ".+-eE":
+                out.pop()
+
+    _rstrip(out)
+    # A bare object key with no value: drop it.
+    if stack and stack[-1] == "}" and out and out[-1] == '"' and str_start >= 0:
+        if _last_significant(out, str_start) in "{,":
+            del out[str_start:]
+            _rstrip(out)
+
+    if out and out[-1] == ":":
+        out.extend("null")
+    elif out and out[-1] == ",":
+        out.pop()
+
+
+def repair_json(text: str) -> str:
+    # Every caller expects an object, so scan from the first "{": a bracket in leading
+    # chatter ("Note [1]: {...}") must not win. Arrays are only a fallback.
+    start = text.find("{")
+    if start == -1:
+        start = text.find("[")
+    if start == -1:
+        return text.strip()
+
+    out: list[str] = []
+    stack: list[str] = []
+    in_str = False
+    esc = False
+    str_start = -1
+
+    for ch in text[start:]:
+        if in_str:
+            out.append(ch)
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+            continue
+
+        c = _cls(ch)
+        if c & _QUOTE:
+            str_start = len(out)
+            in_str = True
+            out.append(ch)
+        elif c & _OPEN:
+            stack.append(_CLOSER[ch])
+            out.append(ch)
+        elif c & _CLOSE:
+            if ch not in stack:
+                continue  # stray closer
+            _rstrip(out)
+            if out and out[-1] == ",":
+                out.pop()
+            while stack:
+                closer = stack.pop()
+                out.append(closer)
+                if closer == ch:
+                    break
+            if not stack:
+                # Top-level value complete; ignore trailing chatter.
+                return "".join(out)
+        else:
+            out.append(ch)
+
+    # Truncated input.
+    if in_str:
+        if esc:
+            out.pop()
+        out.append('"')
+    _complete_tail(out, stack, str_start)
+    while stack:
+        out.append(stack.pop())
+    return "".join(out)
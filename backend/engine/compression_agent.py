@@ -1,9 +1,9 @@
 from __future__ import annotations
 
-import json
 from typing import Any, Dict, List, Optional
 
-from .llm_client import LlmClient
+from . import _json
+from .llm_client import LlmClient, volatile_last
 
 
 COMPRESSION_SYSTEM = """
@@ -20,8 +20,10 @@ Your job:
 
 You will receive:
 - objective
-- full_messages (verbatim)
-- prior_cwm (may be null)
+- new_messages: messages since prior_cwm was last built, compacted as
+  {"r": role initial (u=user, a=assistant), "c": verbatim content, "i": message id}
+  (use "i" values in source_message_ids)
+- prior_cwm (may be null; dropped[] history omitted)
 
 Output JSON schema:
 {
@@ -52,9 +54,10 @@ Rules:
 """.strip()
 
 
-def _fallback_compress(objective: str, full_messages: List[Dict[str, Any]], prior_cwm: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-    # Deterministic baseline: keep only user messages as facts.
-    cwm = prior_cwm or {
+def _fallback_compress(objective: str, new_messages: List[Dict[str, Any]], prior_cwm: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    # Deterministic baseline: keep only user messages as facts. prior_cwm is copied, not
+    # mutated: step() reads it for retrieval while compression runs alongside.
+    cwm = dict(prior_cwm) if prior_cwm else {
         "facts": [],
         "decisions": [],
         "constraints": [],
@@ -64,8 +67,9 @@ def _fallback_compress(objective: str, full_messages: List[Dict[str, Any]], prio
         "dropped": [],
         "updated_at": "",
     }
+    cwm["facts"] = list(cwm.get("facts") or [])
 
-    for m in full_messages[-20:]:
+    for m in new_messages[-20:]:
         if m.get("role") == "user":
             cwm["facts"].append(
                 {
@@ -83,28 +87,40 @@ def _fallback_compress(objective: str, full_messages: List[Dict[str, Any]], prio
     return cwm
 
 
+def _compact_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Role initial + content + id only; timestamps, run/step fields are not worth their tokens.
+    return [
+        {"r": (m.get("role") or "?")[0], "c": m.get("content", ""), "i": m.get("message_id")}
+        for m in messages
+    ]
+
+
+def _compact_cwm(cwm: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # dropped[] is a historical reasoning artifact; the model does not need it to update memory.
+    if not cwm:
+        return cwm
+    return {k: v for k, v in cwm.items() if k != "dropped"}
+
+
 async def compress(
     llm: LlmClient | None,
     objective: str,
-    full_messages: List[Dict[str, Any]],
+    new_messages: List[Dict[str, Any]],
     prior_cwm: Optional[Dict[str, Any]],
     use_llm: bool,
 ) -> Dict[str, Any]:
     if not use_llm or llm is None:
-        return _fallback_compress(objective, full_messages, prior_cwm)
-
-    payload = {
-        "objective": objective,
-        "full_messages": full_messages,
-        "prior_cwm": prior_cwm,
-    }
-
-    text = await llm.ask(COMPRESSION_SYSTEM, json.dumps(payload, ensure_ascii=False))
-    try:
-        return json.loads(text)
-    except Exception:
-        start = text.find("{")
-        end = text.rfind("}")
-        if start != -1 and end != -1 and end > start:
-            return json.loads(text[start : end + 1])
-        raise
+        return _fallback_compress(objective, new_messages, prior_cwm)
+
+    # Incremental: only messages newer than the prior CWM are sent, so the call is
+    # O(delta) rather than O(history). Stable fields first to keep the cached prefix long.
+    payload = volatile_last(
+        {
+            "objective": objective,
+            "prior_cwm": _compact_cwm(prior_cwm),
+            "new_messages": _compact_messages(new_messages),
+        }
+    )
+
+    text = await llm.ask("compression", COMPRESSION_SYSTEM, _json.dumps(payload).decode())
+    return _json.loads_loose(text)
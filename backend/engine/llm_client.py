@@ -1,10 +1,19 @@
 from __future__ import annotations
 
 import os
+import secrets
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Iterable
 
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+try:
+    from emergentintegrations.llm.chat import LlmChat, UserMessage
+except ImportError:  # deterministic runs (use_llm=False) never build a client
+    LlmChat = UserMessage = None
+
+
+# Fields that change on every step. Keeping them at the end of serialized payloads
+# maximises the byte-identical prefix the provider can serve from its prompt cache.
+VOLATILE_KEYS = ("message_id", "source_message_ids", "ts", "updated_at")
 
 
 @dataclass
@@ -13,25 +22,48 @@ class LlmSettings:
     model: str = "gpt-5.2"
 
 
+def _api_key() -> str:
+    api_key = os.environ.get("EMERGENT_LLM_KEY")
+    if not api_key:
+        raise RuntimeError("EMERGENT_LLM_KEY is missing in backend/.env")
+    return api_key
+
+
+def volatile_last(obj: Any, volatile: Iterable[str] = VOLATILE_KEYS) -> Any:
+    # Recursively reorder dict keys so volatile fields are serialized last.
+    if isinstance(obj, dict):
+        keys = [k for k in obj if k not in volatile] + [k for k in obj if k in volatile]
+        return {k: volatile_last(obj[k], volatile) for k in keys}
+    if isinstance(obj, list):
+        return [volatile_last(x, volatile) for x in obj]
+    return obj
+
+
 class LlmClient:
     def __init__(self, settings: LlmSettings, session_id: str):
-        api_key = os.environ.get("EMERGENT_LLM_KEY")
-        if not api_key:
-            raise RuntimeError("EMERGENT_LLM_KEY is missing in backend/.env")
+        # Fail fast on a missing SDK or key; chats themselves are built per call.
+        if LlmChat is None:
+            raise RuntimeError("emergentintegrations is not installed")
+        self.api_key = _api_key()
+        self.settings = settings
+        self.session_id = session_id
 
-        self.chat = (
+    def _new_chat(self, agent_role: str, system_message: str) -> LlmChat:
+        # A fresh chat per call: LlmChat keeps message history per session, so reusing one
+        # would resend every earlier payload/reply. The role's system prompt is still the
+        # true (identical) system message, which is what the provider prefix-caches on.
+        return (
             LlmChat(
-                api_key=api_key,
-                session_id=session_id,
-                system_message="You are a careful infrastructure agent. Output strictly valid JSON when requested.",
+                api_key=self.api_key,
+                session_id=f"{self.session_id}:{agent_role}:{secrets.token_hex(4)}",
+                system_message=system_message,
             )
-            .with_model(settings.provider, settings.model)
+            .with_model(self.settings.provider, self.settings.model)
         )
 
-    async def ask(self, system_message: str, user_text: str) -> str:
-        # emergentintegrations takes a system message at init; but we can steer with a
-        # prefixed instruction in the user text for MVP.
-        prompt = f"SYSTEM OVERRIDE:\n{system_message}\n\nUSER:\n{user_text}"
-        resp = await self.chat.send_message(UserMessage(text=prompt))
+    async def ask(self, agent_role: str, system_message: str, user_text: str) -> str:
+        chat = self._new_chat(agent_role, system_message)
+        resp = await chat.send_message(UserMessage(text=user_text))
         # resp is text
         return str(resp)
+
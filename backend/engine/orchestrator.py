@@ -1,18 +1,20 @@
 from __future__ import annotations
 
-import uuid
-from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+import asyncio
+import secrets
+from itertools import chain
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypedDict
 
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from .llm_client import LlmClient, LlmSettings
-from .token_utils import estimate_tokens
+from .token_utils import estimate_tokens_from_length, estimate_tokens_from_parts
 from .compression_agent import compress
 from .retrieval_agent import retrieve_minimal, assemble_injected_context
 from .worker_agents import run_planner, run_critic
 from . import storage
-from memory_store import load_cwm_runtime, save_cwm_from_runtime
+from memory_store import aload_cwm_runtime, asave_cwm_from_runtime
 
 
 def now_iso() -> str:
@@ -20,42 +22,101 @@ def now_iso() -> str:
 
 
 def new_id(prefix: str) -> str:
-    return f"{prefix}_{uuid.uuid4().hex[:12]}"
+    return f"{prefix}_{secrets.token_hex(6)}"
 
 
-def msg_doc(run_id: str, role: str, content: str, step_index: int) -> Dict[str, Any]:
+# Document shapes. These stay plain dicts (Motor inserts dicts; a struct would only add
+# a conversion step), typed so the fixed key sets are checked statically.
+class MessageDoc(TypedDict):
+    message_id: str
+    run_id: str
+    role: str
+    content: str
+    step_index: int
+    ts: str
+
+
+class EventDoc(TypedDict):
+    id: str
+    run_id: str
+    step_index: int
+    ts: str
+    type: str
+    payload: Dict[str, Any]
+
+
+def step_clock() -> Callable[[], str]:
+    # One clock read per step; each call returns the base time plus one more microsecond,
+    # so documents within a step stay strictly ordered by ts.
+    base = datetime.now(timezone.utc)
+    tick = 0
+
+    def next_ts() -> str:
+        nonlocal tick
+        ts = (base + timedelta(microseconds=tick)).isoformat(timespec="microseconds")
+        tick += 1
+        return ts
+
+    return next_ts
+
+
+def msg_doc(run_id: str, role: str, content: str, step_index: int, ts: Optional[str] = None) -> MessageDoc:
     return {
         "message_id": new_id("msg"),
         "run_id": run_id,
         "role": role,
         "content": content,
         "step_index": step_index,
-        "ts": now_iso(),
+        "ts": ts or now_iso(),
     }
 
 
-def event_doc(run_id: str, step_index: int, type_: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+def event_doc(
+    run_id: str, step_index: int, type_: str, payload: Dict[str, Any], ts: Optional[str] = None
+) -> EventDoc:
     return {
         "id": new_id("evt"),
         "run_id": run_id,
         "step_index": step_index,
-        "ts": now_iso(),
+        "ts": ts or now_iso(),
         "type": type_,
         "payload": payload,
     }
 
 
+def _joined_parts(texts: Iterable[str], sep: str = "\n") -> Iterator[str]:
+    # Parts of sep.join(texts), for length accounting without concatenation.
+    for i, t in enumerate(texts):
+        if i:
+            yield sep
+        yield t
+
+
+def _transcript_parts(messages: List[Dict[str, Any]]) -> Iterator[str]:
+    # Parts of "\n".join(role + ":" + content for each message).
+    for i, m in enumerate(messages):
+        if i:
+            yield "\n"
+        yield m.get("role", "")
+        yield ":"
+        yield m.get("content", "")
+
+
+def _message_chars(role: str, content: str) -> int:
+    # Characters a message adds to the baseline blob: "\n" + role + ":" + content.
+    return len(role) + len(content) + 2
+
+
 def should_compress(
     config: Dict[str, Any],
     step_index: int,
     baseline_tokens: int,
 ) -> bool:
+    # baseline_tokens is needed for the step metrics anyway, so it is passed in computed.
     if baseline_tokens >= int(config.get("compression_token_threshold", 2400)):
         return True
     interval = int(config.get("compression_interval_steps", 4))
-    if interval > 0 and step_index > 0 and step_index % interval == 0:
-        return True
-    return False
+    return interval > 0 and step_index > 0 and step_index % interval == 0
 
 
 async def step(db: AsyncIOMotorDatabase, run_id: str, user_message: str) -> Dict[str, Any]:
@@ -67,23 +128,48 @@ async def step(db: AsyncIOMotorDatabase, run_id: str, user_message: str) -> Dict
     use_llm = bool(config.get("use_llm", True))
 
     step_index = int(run.get("step_index", 0)) + 1
-
-    # Store user message
-    user_doc = msg_doc(run_id, "user", user_message, step_index)
-    await storage.append_message(db, run_id, user_doc)
-
-    # Load memories
-    full_messages = await storage.list_messages(db, run_id, limit=500)
-    stm_tail = await storage.list_stm_tail(db, run_id, limit=int(config.get("stm_max_messages", 12)))
-    # Disk-backed CWM is the source of truth (global, survives restarts)
-    cwm = load_cwm_runtime()
-    ltm = await storage.get_latest_ltm(db, run_id)
-
-    # Baseline: full transcript injected (approx), including objective.
-    baseline_blob = run.get("objective", "") + "\n" + "\n".join(
-        [m.get("role", "") + ":" + m.get("content", "") for m in full_messages]
+    clock = step_clock()
+
+    # The user message is persisted with the assistant reply at the end of the step;
+    # it is folded into the loaded transcript locally below.
+    user_doc = msg_doc(run_id, "user", user_message, step_index, ts=clock())
+    stm_limit = int(config.get("stm_max_messages", 12))
+    # Events and messages are buffered and flushed in one batch at the end of the step
+    # (also when the step fails part-way).
+    events: List[EventDoc] = []
+
+    # Step DAG (critical path is retrieval -> planner -> critic, ~seconds per LLM call):
+    #
+    #   reads (new messages | stm tail | cwm | ltm)
+    #     -> retrieval LLM -> planner LLM -> critic LLM --+-> CWM save -> snapshot file write
+    #     -> compression LLM (task) ----------------------+
+    #     -> flush (messages | events | metrics | run) in one concurrent batch
+    #
+    # Compression needs only the new messages and the prior CWM, and whether it fires is
+    # known once the reads are in, so its LLM call runs as a task alongside the worker
+    # chain. The CWM is saved only once that chain has succeeded; a saved CWM always
+    # advances last_compressed_ts, so its messages are never compressed into it twice.
+
+    # Load memories. Disk-backed CWM is the source of truth (global, survives restarts).
+    # Only messages since the last compression are read; they are all compress() needs.
+    new_messages, stm_tail, cwm, ltm = await asyncio.gather(
+        storage.list_messages_since(db, run_id, run.get("last_compressed_ts", "")),
+        storage.list_stm_tail(db, run_id, limit=stm_limit),
+        aload_cwm_runtime(),
+        storage.get_latest_ltm(db, run_id),
     )
-    baseline_tokens = estimate_tokens(baseline_blob)
+    new_messages.append(user_doc)
+    stm_tail = (stm_tail + [user_doc])[-stm_limit:]
+
+    # Baseline: full transcript injected (approx), including objective. The run keeps a
+    # running character count of its transcript so this is O(1) per step; runs created
+    # before the counter existed are seeded from the stored transcript once.
+    running_chars = run.get("running_chars")
+    if running_chars is None:
+        transcript = await storage.list_messages(db, run_id, limit=500)
+        running_chars = sum(_message_chars(m.get("role", ""), m.get("content", "")) for m in transcript)
+    running_chars += _message_chars("user", user_message)
+    baseline_tokens = estimate_tokens_from_length(len(run.get("objective", "")) + running_chars)
 
     llm: Optional[LlmClient] = None
     if use_llm:
@@ -92,104 +178,140 @@ async def step(db: AsyncIOMotorDatabase, run_id: str, user_message: str) -> Dict
             session_id=f"run:{run_id}:step:{step_index}",
         )
 
-    # Retrieval + injection
-    retrieval = await retrieve_minimal(
-        llm=llm,
-        objective=run.get("objective", ""),
-        user_message=user_message,
-        stm_tail=stm_tail,
-        cwm=cwm,
-        ltm=ltm,
-        use_llm=use_llm,
-    )
-    injected_context = assemble_injected_context(retrieval, cwm=cwm, ltm=ltm)
-
-    # Compressed prompt approximation: objective + injected memory + STM tail + latest user message.
-    injected_blob = "\n".join([m.get("content", "") for m in injected_context])
-    stm_blob = "\n".join([m.get("role", "") + ":" + m.get("content", "") for m in stm_tail])
-    compressed_blob = run.get("objective", "") + "\n" + injected_blob + "\n" + stm_blob + "\nuser:" + user_message
-    injected_tokens = estimate_tokens(compressed_blob)
-
-    await storage.insert_event(db, event_doc(run_id, step_index, "retrieval", {"retrieval": retrieval, "injected_tokens": injected_tokens}))
-
-    # Worker: planner + critic
-    planner_out: Dict[str, Any] = {
-        "assistant_message": "(LLM disabled)",
-        "artifacts": {"plan_steps": [], "proposed_changes": [], "open_questions": []},
-    }
-    critic_out: Dict[str, Any] = {
-        "verdict": "warn",
-        "issues": [{"severity": "low", "text": "LLM disabled; critic limited."}],
-        "missing_memory": [],
-        "suggested_fixes": [],
-    }
+    # Decide compression
+    triggered = should_compress(config, step_index, baseline_tokens)
 
-    if use_llm and llm is not None:
-        planner_out = await run_planner(
-            llm=llm,
-            objective=run.get("objective", ""),
-            injected_context=injected_context,
-            stm_tail=stm_tail,
-            latest_user_message=user_message,
+    compress_task: Optional[asyncio.Task] = None
+    if triggered:
+        # Only messages since the last compression of this run feed the new CWM.
+        compress_task = asyncio.create_task(
+            compress(
+                llm=llm,
+                objective=run.get("objective", ""),
+                new_messages=new_messages,
+                prior_cwm=cwm,
+                use_llm=use_llm,
+            )
         )
-        await storage.insert_event(db, event_doc(run_id, step_index, "planner", planner_out))
 
-        critic_out = await run_critic(
+    messages_out: List[MessageDoc] = [user_doc]
+    metrics: Optional[Dict[str, Any]] = None
+    # Patch for a step that fails part-way: its user message is in the transcript now.
+    run_patch: Dict[str, Any] = {"updated_at": user_doc["ts"], "step_index": step_index, "running_chars": running_chars}
+    try:
+        # Retrieval + injection
+        retrieval = await retrieve_minimal(
             llm=llm,
             objective=run.get("objective", ""),
-            injected_context=injected_context,
+            user_message=user_message,
             stm_tail=stm_tail,
-            latest_user_message=user_message,
-            planner_output=planner_out,
+            cwm=cwm,
+            ltm=ltm,
+            use_llm=use_llm,
+        )
+        injected_context = assemble_injected_context(retrieval, cwm=cwm, ltm=ltm)
+
+        # Compressed prompt approximation: objective + injected memory + STM tail + latest user message.
+        injected_tokens = estimate_tokens_from_parts(
+            chain(
+                [run.get("objective", ""), "\n"],
+                _joined_parts(m.get("content", "") for m in injected_context),
+                ["\n"],
+                _transcript_parts(stm_tail),
+                ["\nuser:", user_message],
+            )
         )
-        await storage.insert_event(db, event_doc(run_id, step_index, "critic", critic_out))
 
-    assistant_message = planner_out.get("assistant_message", "")
-    assistant_doc = msg_doc(run_id, "assistant", assistant_message, step_index)
-    await storage.append_message(db, run_id, assistant_doc)
+        events.append(
+            event_doc(
+                run_id, step_index, "retrieval", {"retrieval": retrieval, "injected_tokens": injected_tokens}, ts=clock()
+            )
+        )
 
-    # Decide compression
-    triggered = should_compress(config, step_index, baseline_tokens)
+        # Worker: planner + critic
+        planner_out: Dict[str, Any] = {
+            "assistant_message": "(LLM disabled)",
+            "artifacts": {"plan_steps": [], "proposed_changes": [], "open_questions": []},
+        }
+        critic_out: Dict[str, Any] = {
+            "verdict": "warn",
+            "issues": [{"severity": "low", "text": "LLM disabled; critic limited."}],
+            "missing_memory": [],
+            "suggested_fixes": [],
+        }
 
-    new_cwm = None
-    snapshot_path = None
-    if triggered:
-        new_cwm = await compress(
-            llm=llm,
-            objective=run.get("objective", ""),
-            full_messages=full_messages,
-            prior_cwm=cwm,
-            use_llm=use_llm,
-        )
-        # Persist ONLY strict CWM schema to disk after compression completes
-        save_cwm_from_runtime(new_cwm)
-        await storage.insert_event(db, event_doc(run_id, step_index, "compression", {"cwm": new_cwm}))
-
-        snapshot = {
-            "run_id": run_id,
-            "step_index": step_index,
-            "objective": run.get("objective", ""),
-            "cwm": new_cwm,
-            "retrieval": retrieval,
-            "ts": now_iso(),
+        if use_llm and llm is not None:
+            planner_out = await run_planner(
+                llm=llm,
+                objective=run.get("objective", ""),
+                injected_context=injected_context,
+                stm_tail=stm_tail,
+                latest_user_message=user_message,
+            )
+            events.append(event_doc(run_id, step_index, "planner", planner_out, ts=clock()))
+
+            critic_out = await run_critic(
+                llm=llm,
+                objective=run.get("objective", ""),
+                injected_context=injected_context,
+                stm_tail=stm_tail,
+                latest_user_message=user_message,
+                planner_output=planner_out,
+            )
+            events.append(event_doc(run_id, step_index, "critic", critic_out, ts=clock()))
+
+        assistant_message = planner_out.get("assistant_message", "")
+        messages_out.append(msg_doc(run_id, "assistant", assistant_message, step_index, ts=clock()))
+        # Counted as soon as it is queued: the finally flushes it even if a later stage fails.
+        run_patch["running_chars"] = running_chars + _message_chars("assistant", assistant_message)
+
+        new_cwm = None
+        snapshot_path = None
+        if compress_task is not None:
+            new_cwm = await compress_task
+            # Persist ONLY strict CWM schema to disk after compression completes
+            await asave_cwm_from_runtime(new_cwm)
+            run_patch["last_compressed_ts"] = user_doc["ts"]
+
+            snapshot = {
+                "run_id": run_id,
+                "step_index": step_index,
+                "objective": run.get("objective", ""),
+                "cwm": new_cwm,
+                "retrieval": retrieval,
+                "ts": clock(),
+            }
+            events.append(event_doc(run_id, step_index, "compression", {"cwm": new_cwm}, ts=clock()))
+            snapshot_path = await storage.write_snapshot(run_id, snapshot)
+            events.append(event_doc(run_id, step_index, "snapshot", {"path": snapshot_path}, ts=clock()))
+
+        reduction_pct = 0.0
+        if baseline_tokens > 0:
+            reduction_pct = max(0.0, float(baseline_tokens - injected_tokens) / float(baseline_tokens)) * 100.0
+
+        metrics = {
+            "baseline_tokens": baseline_tokens,
+            "injected_tokens": injected_tokens,
+            "reduction_pct": reduction_pct,
+            "last_snapshot_path": snapshot_path,
+            "critic_verdict": critic_out.get("verdict"),
         }
-        snapshot_path = storage.write_snapshot(run_id, snapshot)
-        await storage.insert_event(db, event_doc(run_id, step_index, "snapshot", {"path": snapshot_path}))
-
-    reduction_pct = 0.0
-    if baseline_tokens > 0:
-        reduction_pct = max(0.0, float(baseline_tokens - injected_tokens) / float(baseline_tokens)) * 100.0
-
-    metrics = {
-        "baseline_tokens": baseline_tokens,
-        "injected_tokens": injected_tokens,
-        "reduction_pct": reduction_pct,
-        "last_snapshot_path": snapshot_path,
-        "critic_verdict": critic_out.get("verdict"),
-    }
 
-    await storage.set_metrics(db, run_id, metrics)
-    await storage.update_run(db, run_id, {"updated_at": now_iso(), "step_index": step_index})
+        run_patch["updated_at"] = clock()
+    except BaseException:
+        if compress_task is not None:
+            compress_task.cancel()
+        raise
+    finally:
+        # Flush: metrics and run live in different collections, so the writes are
+        # issued concurrently rather than as a single bulk_write. Runs on failure too,
+        # so a failed step still leaves its user message and events so far.
+        await asyncio.gather(
+            storage.append_messages(db, run_id, messages_out),
+            storage.bulk_insert_events(db, events),
+            *([storage.set_metrics(db, run_id, metrics)] if metrics is not None else []),
+            storage.update_run(db, run_id, run_patch),
+        )
 
     return {
         "run_id": run_id,
@@ -210,9 +332,10 @@ async def force_compress(db: AsyncIOMotorDatabase, run_id: str) -> Dict[str, Any
     use_llm = bool(config.get("use_llm", True))
 
     step_index = int(run.get("step_index", 0))
-    full_messages = await storage.list_messages(db, run_id, limit=500)
+    clock = step_clock()
+    new_messages = await storage.list_messages_since(db, run_id, run.get("last_compressed_ts", ""))
     # Disk-backed CWM is the source of truth (global, survives restarts)
-    cwm = load_cwm_runtime()
+    cwm = await aload_cwm_runtime()
 
     llm: Optional[LlmClient] = None
     if use_llm:
@@ -221,20 +344,27 @@ async def force_compress(db: AsyncIOMotorDatabase, run_id: str) -> Dict[str, Any
             session_id=f"run:{run_id}:compress:{step_index}",
         )
 
-    new_cwm = await compress(llm=llm, objective=run.get("objective", ""), full_messages=full_messages, prior_cwm=cwm, use_llm=use_llm)
+    new_cwm = await compress(llm=llm, objective=run.get("objective", ""), new_messages=new_messages, prior_cwm=cwm, use_llm=use_llm)
     # Persist ONLY strict CWM schema to disk after compression completes
-    save_cwm_from_runtime(new_cwm)
-    await storage.insert_event(db, event_doc(run_id, step_index, "compression", {"cwm": new_cwm, "forced": True}))
+    await asave_cwm_from_runtime(new_cwm)
+    events = [event_doc(run_id, step_index, "compression", {"cwm": new_cwm, "forced": True}, ts=clock())]
 
     snapshot = {
         "run_id": run_id,
         "step_index": step_index,
         "objective": run.get("objective", ""),
         "cwm": new_cwm,
-        "ts": now_iso(),
+        "ts": clock(),
         "forced": True,
     }
-    snapshot_path = storage.write_snapshot(run_id, snapshot)
-    await storage.insert_event(db, event_doc(run_id, step_index, "snapshot", {"path": snapshot_path}))
+    try:
+        snapshot_path = await storage.write_snapshot(run_id, snapshot)
+        events.append(event_doc(run_id, step_index, "snapshot", {"path": snapshot_path}, ts=clock()))
+    finally:
+        # The CWM is saved: advance the watermark even if the snapshot write failed.
+        writes = [storage.bulk_insert_events(db, events)]
+        if new_messages:
+            writes.append(storage.update_run(db, run_id, {"last_compressed_ts": new_messages[-1]["ts"]}))
+        await asyncio.gather(*writes)
 
     return {"run_id": run_id, "step_index": step_index, "cwm": new_cwm, "snapshot_path": snapshot_path}
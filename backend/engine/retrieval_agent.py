@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-import json
+import re
 from typing import Any, Dict, List
 
-from .llm_client import LlmClient
+from . import _json
+from .llm_client import LlmClient, volatile_last
 
 
 RETRIEVAL_SYSTEM = """
@@ -36,6 +37,20 @@ Selection rules:
 """.strip()
 
 
+_WORD_RE = re.compile(r"\w+")
+
+# (cwm section, output key, item key field), in tie-break priority order.
+_FALLBACK_SECTIONS = (
+    ("constraints", "constraints_ids", "id"),
+    ("definitions", "definitions_terms", "term"),
+    ("decisions", "decisions_ids", "id"),
+    ("facts", "facts_ids", "id"),
+    ("assumptions", "assumptions_ids", "id"),
+    ("open_loops", "open_loop_ids", "id"),
+)
+_FALLBACK_MAX_PICKS = 8
+
+
 def _fallback_retrieve(objective: str, user_message: str, cwm: Dict[str, Any] | None) -> Dict[str, Any]:
     # Simple deterministic keyword match. Not great, but reproducible.
     user_lower = (objective + "\n" + user_message).lower()
@@ -51,28 +66,24 @@ def _fallback_retrieve(objective: str, user_message: str, cwm: Dict[str, Any] |
     if not cwm:
         return out
 
-    def maybe_pick(section: str, out_key: str, id_key: str = "id"):
-        items = cwm.get(section, [])
-        for it in items:
+    # Tokenize the query once, then score every active item by token overlap in a
+    # single pass; the highest-overlap items win (ties keep section/item order).
+    query_tokens = set(_WORD_RE.findall(user_lower)[:20])
+    scored = []
+    for section, out_key, key_field in _FALLBACK_SECTIONS:
+        for it in cwm.get(section, []):
             if it.get("status") == "deprecated":
                 continue
             text = (it.get("text") or it.get("definition") or "").lower()
             if not text:
                 continue
-            if any(tok in text for tok in user_lower.split()[:20]):
-                if out_key == "definitions_terms":
-                    out[out_key].append(it.get("term"))
-                else:
-                    out[out_key].append(it.get(id_key))
-                if sum(len(v) for k, v in out.items() if k.endswith("ids") or k.endswith("terms")) >= 8:
-                    return
-
-    maybe_pick("constraints", "constraints_ids")
-    maybe_pick("definitions", "definitions_terms", id_key="term")
-    maybe_pick("decisions", "decisions_ids")
-    maybe_pick("facts", "facts_ids")
-    maybe_pick("assumptions", "assumptions_ids")
-    maybe_pick("open_loops", "open_loop_ids")
+            score = len(query_tokens.intersection(_WORD_RE.findall(text)))
+            if score:
+                scored.append((-score, len(scored), out_key, it.get(key_field)))
+
+    scored.sort()
+    for _, _, out_key, key in scored[:_FALLBACK_MAX_PICKS]:
+        out[out_key].append(key)
     return out
 
 
@@ -88,25 +99,25 @@ async def retrieve_minimal(
     if not use_llm or llm is None:
         return _fallback_retrieve(objective, user_message, cwm)
 
-    payload = {
-        "objective": objective,
-        "latest_user_message": user_message,
-        "stm_tail": stm_tail,
-        "cwm": cwm,
-        "ltm": ltm,
-    }
+    # Stable fields first, per-step fields last, to keep the cached prefix long.
+    payload = volatile_last(
+        {
+            "objective": objective,
+            "ltm": ltm,
+            "cwm": cwm,
+            "stm_tail": stm_tail,
+            "latest_user_message": user_message,
+        }
+    )
 
-    text = await llm.ask(RETRIEVAL_SYSTEM, json.dumps(payload, ensure_ascii=False))
+    text = await llm.ask("retrieval", RETRIEVAL_SYSTEM, _json.dumps(payload).decode())
 
     # Be resilient: attempt to extract JSON.
-    try:
-        return json.loads(text)
-    except Exception:
-        start = text.find("{")
-        end = text.rfind("}")
-        if start != -1 and end != -1 and end > start:
-            return json.loads(text[start : end + 1])
-        raise
+    return _json.loads_loose(text)
+
+
+# section -> field used as the lookup key
+_INDEXED_SECTIONS = {"constraints": "id", "definitions": "term", "decisions": "id", "facts": "id"}
 
 
 def assemble_injected_context(
@@ -119,31 +130,30 @@ def assemble_injected_context(
     if not cwm:
         return injected
 
-    def by_ids(section: str, ids: List[str]) -> List[Dict[str, Any]]:
-        items = cwm.get(section, [])
-        idx = {it.get("id"): it for it in items if it.get("id")}
-        return [idx[i] for i in ids if i in idx]
-
-    def defs_by_terms(terms: List[str]) -> List[Dict[str, Any]]:
-        items = cwm.get("definitions", [])
-        idx = {it.get("term"): it for it in items if it.get("term")}
-        return [idx[t] for t in terms if t in idx]
+    def select(section: str, keys: List[str]) -> List[Dict[str, Any]]:
+        # The runtime CWM is a fresh object on every load, so the index is built per call,
+        # and only for sections the retrieval actually asked for.
+        if not keys:
+            return []
+        field = _INDEXED_SECTIONS[section]
+        idx = {it.get(field): it for it in cwm.get(section, []) if it.get(field)}
+        return [idx[k] for k in keys if k in idx]
 
-    constraints = by_ids("constraints", retrieval.get("constraints_ids", []))
-    definitions = defs_by_terms(retrieval.get("definitions_terms", []))
-    decisions = by_ids("decisions", retrieval.get("decisions_ids", []))
-    facts = by_ids("facts", retrieval.get("facts_ids", []))
+    constraints = select("constraints", retrieval.get("constraints_ids", []))
+    definitions = select("definitions", retrieval.get("definitions_terms", []))
+    decisions = select("decisions", retrieval.get("decisions_ids", []))
+    facts = select("facts", retrieval.get("facts_ids", []))
 
     # LTM (optional): inject only if requested via terms/ids not found in CWM.
     # MVP keeps it simple.
 
     if constraints:
-        injected.append({"role": "system", "content": "CONSTRAINTS:\n" + json.dumps(constraints, ensure_ascii=False)})
+        injected.append({"role": "system", "content": "CONSTRAINTS:\n" + _json.dumps(constraints).decode()})
     if definitions:
-        injected.append({"role": "system", "content": "DEFINITIONS:\n" + json.dumps(definitions, ensure_ascii=False)})
+        injected.append({"role": "system", "content": "DEFINITIONS:\n" + _json.dumps(definitions).decode()})
     if decisions:
-        injected.append({"role": "system", "content": "DECISIONS:\n" + json.dumps(decisions, ensure_ascii=False)})
+        injected.append({"role": "system", "content": "DECISIONS:\n" + _json.dumps(decisions).decode()})
     if facts:
-        injected.append({"role": "system", "content": "FACTS:\n" + json.dumps(facts, ensure_ascii=False)})
+        injected.append({"role": "system", "content": "FACTS:\n" + _json.dumps(facts).decode()})
 
     return injected
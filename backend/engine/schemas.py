@@ -3,7 +3,7 @@ from __future__ import annotations
 from pydantic import BaseModel, Field
 from typing import Any, Dict, List, Literal, Optional
 from datetime import datetime, timezone
-import uuid
+import secrets
 
 
 def now_iso() -> str:
@@ -11,7 +11,7 @@ def now_iso() -> str:
 
 
 def new_id(prefix: str) -> str:
-    return f"{prefix}_{uuid.uuid4().hex[:12]}"
+    return f"{prefix}_{secrets.token_hex(6)}"
 
 
 Confidence = Literal["high", "medium", "low"]
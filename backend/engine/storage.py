@@ -1,52 +1,102 @@
 from __future__ import annotations
 
-import copy
-import json
+import asyncio
+import time
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Sequence
 
+import orjson
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from bson import ObjectId
 
 
 def now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-
-def sanitize_for_json(obj: Any) -> Any:
-    # Recursively convert MongoDB ObjectId to str (and handle nested payloads).
-    if isinstance(obj, ObjectId):
-        return str(obj)
-    if isinstance(obj, dict):
-        return {k: sanitize_for_json(v) for k, v in obj.items() if k != "_id"}
-    if isinstance(obj, list):
-        return [sanitize_for_json(x) for x in obj]
-    return obj
-
-
 def _snap_dir(run_id: str) -> Path:
     base = Path(__file__).resolve().parent.parent / "snapshots" / run_id
     base.mkdir(parents=True, exist_ok=True)
     return base
 
 
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> None:
+    # Idempotent. (run_id, ts) serves both ascending list_* reads and the descending
+    # STM tail read (the index is walked backwards), with no in-memory sort stage.
+    await asyncio.gather(
+        db.messages.create_index([("run_id", 1), ("ts", 1)]),
+        db.events.create_index([("run_id", 1), ("ts", 1)]),
+        db.events.create_index([("run_id", 1), ("id", 1)]),
+        db.runs.create_index("run_id", unique=True),
+        db.cwm.create_index("run_id", unique=True),
+        db.ltm.create_index("run_id", unique=True),
+        db.metrics.create_index("run_id", unique=True),
+    )
+
+
 async def create_run(db: AsyncIOMotorDatabase, run_doc: Dict[str, Any]) -> None:
-    # MongoDB insert mutates dict by adding _id; avoid leaking ObjectId into other payloads.
-    await db.runs.insert_one(copy.deepcopy(run_doc))
+    # MongoDB insert mutates dict by adding _id (top level only); a shallow copy is
+    # enough to avoid leaking ObjectId into other payloads.
+    await db.runs.insert_one({**run_doc})
+    _remember_config(run_doc)
+
+
+async def create_run_with_event(
+    db: AsyncIOMotorDatabase, run_doc: Dict[str, Any], event: Dict[str, Any]
+) -> None:
+    # Both inserts are issued concurrently over the pool: one RTT of latency, not two.
+    await asyncio.gather(db.runs.insert_one({**run_doc}), db.events.insert_one({**event}))
+    _remember_config(run_doc)
 
 
 async def get_run(db: AsyncIOMotorDatabase, run_id: str) -> Optional[Dict[str, Any]]:
     return await db.runs.find_one({"run_id": run_id}, {"_id": 0})
 
 
+# run_id -> (expires_at, config). A run's config never changes after creation, so
+# read endpoints can serve their existence check / config lookup from here. Every write
+# re-inserts at the end with now + TTL, so dict order is expiry order and expired
+# entries are pruned from the front; _RUN_CONFIG_CACHE_MAX caps bursts within one TTL.
+_RUN_CONFIG_TTL_S = 5.0
+_RUN_CONFIG_CACHE_MAX = 1024
+_RUN_CONFIG_CACHE: Dict[str, tuple[float, Dict[str, Any]]] = {}
+
+
+def _remember_config(run_doc: Mapping[str, Any]) -> None:
+    now = time.monotonic()
+    run_id = run_doc["run_id"]
+    _RUN_CONFIG_CACHE.pop(run_id, None)
+    _RUN_CONFIG_CACHE[run_id] = (now + _RUN_CONFIG_TTL_S, run_doc.get("config") or {})
+    while _RUN_CONFIG_CACHE:
+        oldest = next(iter(_RUN_CONFIG_CACHE))
+        if _RUN_CONFIG_CACHE[oldest][0] > now and len(_RUN_CONFIG_CACHE) <= _RUN_CONFIG_CACHE_MAX:
+            break
+        del _RUN_CONFIG_CACHE[oldest]
+
+
+async def get_run_config(db: AsyncIOMotorDatabase, run_id: str) -> Optional[Dict[str, Any]]:
+    # None if the run does not exist. Only hits are cached, so a run created by
+    # another process becomes visible immediately.
+    hit = _RUN_CONFIG_CACHE.get(run_id)
+    if hit is not None:
+        if hit[0] > time.monotonic():
+            return hit[1]
+        del _RUN_CONFIG_CACHE[run_id]
+    doc = await db.runs.find_one({"run_id": run_id}, {"_id": 0, "run_id": 1, "config": 1})
+    if not doc:
+        return None
+    _remember_config(doc)
+    return _RUN_CONFIG_CACHE[run_id][1]
+
+
 async def update_run(db: AsyncIOMotorDatabase, run_id: str, patch: Dict[str, Any]) -> None:
     await db.runs.update_one({"run_id": run_id}, {"$set": patch})
 
 
-async def append_message(db: AsyncIOMotorDatabase, run_id: str, message: Dict[str, Any]) -> None:
-    await db.messages.insert_one(copy.deepcopy(message))
+async def append_messages(db: AsyncIOMotorDatabase, run_id: str, messages: Sequence[Mapping[str, Any]]) -> None:
+    # One round-trip for all messages produced by a step.
+    if messages:
+        await db.messages.insert_many([{**m} for m in messages])
 
 
 async def list_messages(db: AsyncIOMotorDatabase, run_id: str, limit: int = 200) -> List[Dict[str, Any]]:
@@ -55,6 +105,14 @@ async def list_messages(db: AsyncIOMotorDatabase, run_id: str, limit: int = 200)
     )
 
 
+async def list_messages_since(
+    db: AsyncIOMotorDatabase, run_id: str, since_ts: str, limit: int = 500
+) -> List[Dict[str, Any]]:
+    return await (
+        db.messages.find({"run_id": run_id, "ts": {"$gt": since_ts}}, {"_id": 0}).sort("ts", 1).to_list(limit)
+    )
+
+
 async def list_stm_tail(db: AsyncIOMotorDatabase, run_id: str, limit: int) -> List[Dict[str, Any]]:
     msgs = await (
         db.messages.find({"run_id": run_id}, {"_id": 0}).sort("ts", -1).to_list(limit)
@@ -62,15 +120,36 @@ async def list_stm_tail(db: AsyncIOMotorDatabase, run_id: str, limit: int) -> Li
     return list(reversed(msgs))
 
 
-async def insert_event(db: AsyncIOMotorDatabase, event: Dict[str, Any]) -> None:
-    await db.events.insert_one(copy.deepcopy(event))
+async def bulk_insert_events(db: AsyncIOMotorDatabase, events: Sequence[Mapping[str, Any]]) -> None:
+    # One round-trip for all events produced by a step; order does not matter (sorted by ts on read).
+    if events:
+        await db.events.insert_many([{**e} for e in events], ordered=False)
 
 
-async def list_events(db: AsyncIOMotorDatabase, run_id: str, limit: int = 500) -> List[Dict[str, Any]]:
-    docs = await (
-        db.events.find({"run_id": run_id}, {"_id": 0}).sort("ts", 1).to_list(limit)
+# Full event. Events written before run_doc was copied on insert embed the run's
+# ObjectId at payload.run._id; it is excluded server-side, as the old sanitize pass did.
+EVENT_PROJECTION = {"_id": 0, "payload.run._id": 0}
+# Timeline view of an event: everything but the (potentially large) payload.
+EVENT_SUMMARY_PROJECTION = {"_id": 0, "id": 1, "run_id": 1, "step_index": 1, "ts": 1, "type": 1}
+
+
+async def iter_events(
+    db: AsyncIOMotorDatabase,
+    run_id: str,
+    limit: int = 500,
+    projection: Optional[Dict[str, Any]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    # Yields events batch by batch instead of materializing the whole list. Documents are
+    # raw: the response encoder (server.dumps_json) maps any BSON values itself.
+    cursor = (
+        db.events.find({"run_id": run_id}, projection or EVENT_PROJECTION).sort("ts", 1).limit(limit).batch_size(100)
     )
-    return sanitize_for_json(docs)
+    async for doc in cursor:
+        yield doc
+
+
+async def get_event(db: AsyncIOMotorDatabase, run_id: str, event_id: str) -> Optional[Dict[str, Any]]:
+    return await db.events.find_one({"run_id": run_id, "id": event_id}, EVENT_PROJECTION)
 
 
 async def set_latest_cwm(db: AsyncIOMotorDatabase, run_id: str, cwm: Dict[str, Any]) -> None:
@@ -112,17 +191,26 @@ async def get_metrics(db: AsyncIOMotorDatabase, run_id: str) -> Dict[str, Any]:
     return doc.get("metrics") if doc else {}
 
 
-def write_snapshot(run_id: str, snapshot: Dict[str, Any]) -> str:
+def _write_snapshot_sync(run_id: str, snapshot: Dict[str, Any]) -> str:
     out_dir = _snap_dir(run_id)
     ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
     path = out_dir / f"{ts}.json"
-    path.write_text(json.dumps(snapshot, indent=2, ensure_ascii=False))
+    path.write_bytes(orjson.dumps(snapshot, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
     return str(path)
 
 
-def read_latest_snapshot(run_id: str) -> Optional[Dict[str, Any]]:
+def _read_latest_snapshot_sync(run_id: str) -> Optional[Dict[str, Any]]:
     out_dir = _snap_dir(run_id)
     files = sorted([p for p in out_dir.glob("*.json")])
     if not files:
         return None
-    return json.loads(files[-1].read_text())
+    return orjson.loads(files[-1].read_bytes())
+
+
+# Snapshot files can be large; keep the filesystem work off the event loop.
+async def write_snapshot(run_id: str, snapshot: Dict[str, Any]) -> str:
+    return await asyncio.to_thread(_write_snapshot_sync, run_id, snapshot)
+
+
+async def read_latest_snapshot(run_id: str) -> Optional[Dict[str, Any]]:
+    return await asyncio.to_thread(_read_latest_snapshot_sync, run_id)
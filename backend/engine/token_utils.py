@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import math
+from typing import Iterable
 
 
 def estimate_tokens(text: str) -> int:
@@ -10,6 +11,16 @@ def estimate_tokens(text: str) -> int:
     return int(math.ceil(len(text) / 4))
 
 
+def estimate_tokens_from_length(length: int) -> int:
+    # Same as estimate_tokens(text) given only len(text).
+    return (length + 3) // 4
+
+
+def estimate_tokens_from_parts(parts: Iterable[str]) -> int:
+    # Same as estimate_tokens("".join(parts)) without materializing the joined string.
+    return estimate_tokens_from_length(sum(len(p) for p in parts))
+
+
 def estimate_tokens_for_messages(messages: list[dict]) -> int:
     # messages: [{role, content}]
     total = 0
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
-import json
+import hashlib
+from collections import OrderedDict
 from typing import Any, Dict, List, Optional
 
+from . import _json
 from .llm_client import LlmClient
 
 
@@ -52,6 +54,52 @@ Rules:
 """.strip()
 
 
+# Exact-match reply caches, keyed by a hash of (system prompt, model, encoded payload).
+# Payloads carry content only (see _stm_view), so a repeated question over the same
+# context hits. Values are the encoded reply, so every hit decodes a fresh copy.
+_REPLY_CACHE_MAX = 256
+_PLANNER_CACHE: "OrderedDict[bytes, bytes]" = OrderedDict()
+_CRITIC_CACHE: "OrderedDict[bytes, bytes]" = OrderedDict()
+
+# Cache-key hashers pre-seeded with each system prompt at import; calls copy() them
+# instead of re-encoding and re-hashing the same prompt every step.
+_PLANNER_KEY_SEED = hashlib.blake2b(PLANNER_SYSTEM.encode(), digest_size=16)
+_CRITIC_KEY_SEED = hashlib.blake2b(CRITIC_SYSTEM.encode(), digest_size=16)
+
+
+async def _ask_cached(
+    llm: LlmClient,
+    cache: "OrderedDict[bytes, bytes]",
+    agent_role: str,
+    system_message: str,
+    key_seed: Any,
+    payload: Dict[str, Any],
+) -> Dict[str, Any]:
+    body = _json.dumps(payload)
+    h = key_seed.copy()
+    h.update(f"\n{llm.settings.provider}/{llm.settings.model}\n".encode())
+    h.update(body)
+    key = h.digest()
+
+    hit = cache.get(key)
+    if hit is not None:
+        cache.move_to_end(key)
+        return _json.loads(hit)
+
+    text = await llm.ask(agent_role, system_message, body.decode())
+    out = _json.loads_loose(text)
+    cache[key] = _json.dumps(out)
+    if len(cache) > _REPLY_CACHE_MAX:
+        cache.popitem(last=False)
+    return out
+
+
+def _stm_view(stm_tail: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    # Role and content only: ids, run/step fields and timestamps are unique per step,
+    # add tokens, and would make every reply-cache key distinct.
+    return [{"role": m.get("role", ""), "content": m.get("content", "")} for m in stm_tail]
+
+
 async def run_planner(
     llm: LlmClient,
     objective: str,
@@ -62,16 +110,10 @@ async def run_planner(
     payload = {
         "objective": objective,
         "injected_context": injected_context,
-        "stm_tail": stm_tail,
+        "stm_tail": _stm_view(stm_tail),
         "latest_user_message": latest_user_message,
     }
-    text = await llm.ask(PLANNER_SYSTEM, json.dumps(payload, ensure_ascii=False))
-    try:
-        return json.loads(text)
-    except Exception:
-        start = text.find("{")
-        end = text.rfind("}")
-        return json.loads(text[start : end + 1])
+    return await _ask_cached(llm, _PLANNER_CACHE, "planner", PLANNER_SYSTEM, _PLANNER_KEY_SEED, payload)
 
 
 async def run_critic(
@@ -85,14 +127,8 @@ async def run_critic(
     payload = {
         "objective": objective,
         "injected_context": injected_context,
-        "stm_tail": stm_tail,
+        "stm_tail": _stm_view(stm_tail),
         "latest_user_message": latest_user_message,
         "planner_output": planner_output,
     }
-    text = await llm.ask(CRITIC_SYSTEM, json.dumps(payload, ensure_ascii=False))
-    try:
-        return json.loads(text)
-    except Exception:
-        start = text.find("{")
-        end = text.rfind("}")
-        return json.loads(text[start : end + 1])
+    return await _ask_cached(llm, _CRITIC_CACHE, "critic", CRITIC_SYSTEM, _CRITIC_KEY_SEED, payload)
@@ -1,12 +1,21 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import hashlib
+import os
+import threading
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
+import orjson
 
-STRICT_KEYS = ["facts", "decisions", "constraints", "open_loops", "superseded"]
+
+STRICT_KEYS = ("facts", "decisions", "constraints", "open_loops", "superseded")
+_STRICT_KEYS_SET = frozenset(STRICT_KEYS)
+
+# Runtime sections scanned for deprecated items when deriving `superseded`.
+_SUPERSEDABLE_SECTIONS = ("facts", "decisions", "constraints", "definitions", "assumptions", "open_loops")
 
 
 def _project_root() -> Path:
@@ -22,6 +31,10 @@ def _store_path() -> Path:
     return _store_dir() / "memory.json"
 
 
+def _journal_path() -> Path:
+    return _store_dir() / "memory.journal"
+
+
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
@@ -34,10 +47,8 @@ def _validate_strict(cwm: Any) -> Dict[str, List[Any]]:
     if not isinstance(cwm, dict):
         raise ValueError("CWM must be a JSON object")
 
-    keys = set(cwm.keys())
-    expected = set(STRICT_KEYS)
-    if keys != expected:
-        raise ValueError(f"CWM must have EXACT keys {STRICT_KEYS}, got {sorted(keys)}")
+    if cwm.keys() != _STRICT_KEYS_SET:
+        raise ValueError(f"CWM must have EXACT keys {list(STRICT_KEYS)}, got {sorted(cwm.keys())}")
 
     for k in STRICT_KEYS:
         if not isinstance(cwm[k], list):
@@ -46,41 +57,233 @@ def _validate_strict(cwm: Any) -> Dict[str, List[Any]]:
     return cwm
 
 
-def _atomic_write_json(path: Path, data: Any) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    tmp = path.with_suffix(path.suffix + ".tmp")
-    tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False))
-    tmp.replace(path)
+_fdatasync = getattr(os, "fdatasync", os.fsync)  # no fdatasync on macOS
 
 
-def load_strict_cwm() -> Dict[str, List[Any]]:
-    path = _store_path()
-    path.parent.mkdir(parents=True, exist_ok=True)
+def _write_synced(fd: int, data: bytes) -> None:
+    # Loop over short writes, then make the data durable before the caller reports success.
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+    _fdatasync(fd)
+
+
+def _atomic_write_bytes(path: Path, data: bytes) -> None:
+    # Raw fd write + fdatasync + rename: the data is on disk before the rename makes it
+    # visible. The store dir is only created when the open finds it missing.
+    tmp = f"{path}.tmp"
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    try:
+        fd = os.open(tmp, flags, 0o644)
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(tmp, flags, 0o644)
+    try:
+        _write_synced(fd, data)
+    finally:
+        os.close(fd)
+    os.replace(tmp, path)
+
+
+# memory.json is a full snapshot; memory.journal holds one line per save since then.
+# Each journal line is {"d": [[section, keep, added_items], ...]}: the section becomes
+# section[:keep] + added_items. The journal's first line is {"base": digest} of the
+# snapshot it extends, so a journal left over from an interrupted compaction is ignored.
+# Every _COMPACT_EVERY saves the snapshot is rewritten and the journal reset.
+#
+# memory.json alone can therefore lag the store by up to _COMPACT_EVERY - 1 saves; read
+# it through load_strict_cwm. If memory.json is replaced under a journal (hand edit,
+# another writer), the journal no longer matches its base and is set aside as
+# memory.journal.orphaned.<ts> rather than replayed onto the wrong snapshot.
+_COMPACT_EVERY = 32
+
+_lock = threading.RLock()
+# Last persisted strict CWM (diff base for the next save). Items are treated as values:
+# callers get fresh section lists and must not mutate item dicts in place.
+_cache: Optional[Dict[str, List[Any]]] = None
+_journal_entries = 0
+# (mtime_ns, size) of memory.json and memory.journal when _cache was last in sync with disk.
+_cache_stamp: Optional[Tuple[Any, Any]] = None
+
+
+def _file_stamp(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _store_stamp() -> Tuple[Any, Any]:
+    return (_file_stamp(_store_path()), _file_stamp(_journal_path()))
+
+
+def _cached_copy(blocking: bool = True) -> Optional[Dict[str, List[Any]]]:
+    # The cached CWM, if the files on disk are unchanged since it was loaded/saved.
+    # Non-blocking callers get None while a save holds the lock (it may be mid-fsync).
+    if not _lock.acquire(blocking=blocking):
+        return None
+    try:
+        if _cache is not None and _cache_stamp == _store_stamp():
+            return {k: list(v) for k, v in _cache.items()}
+    finally:
+        _lock.release()
+    return None
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def _write_snapshot(cwm: Dict[str, List[Any]]) -> None:
+    data = orjson.dumps(cwm, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    _atomic_write_bytes(_store_path(), data)
+    _atomic_write_bytes(_journal_path(), orjson.dumps({"base": _digest(data)}) + b"\n")
+
+
+def _append_journal(line: bytes) -> None:
+    # As durable as a snapshot write: a save is acknowledged only once its line is synced.
+    fd = os.open(_journal_path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        _write_synced(fd, line)
+    finally:
+        os.close(fd)
+
+
+def _apply_entry(cwm: Dict[str, List[Any]], line: bytes) -> None:
+    # All-or-nothing: a line that does not parse or does not fit the schema changes nothing.
+    patch: Dict[str, List[Any]] = {}
+    for section, keep, added in orjson.loads(line)["d"]:
+        if section not in _STRICT_KEYS_SET or type(keep) is not int or keep < 0 or type(added) is not list:
+            raise ValueError(f"bad journal entry for section {section!r}")
+        patch[section] = patch.get(section, cwm[section])[:keep] + added
+    cwm.update(patch)
+
 
+def _replay_journal(cwm: Dict[str, List[Any]], base: str) -> Tuple[int, bool]:
+    # Returns (entries applied, whether the journal is usable for further appends).
+    path = _journal_path()
+    if not path.exists():
+        return 0, False
+    lines = path.read_bytes().splitlines()
+    try:
+        header_base = orjson.loads(lines[0]).get("base") if lines else None
+    except (ValueError, AttributeError):
+        header_base = None
+    if header_base != base:
+        # Stale journal: memory.json was rewritten without it. Keep it for inspection.
+        if len(lines) > 1:
+            _preserve(path, "orphaned")
+        return 0, False
+
+    applied = 0
+    for line in lines[1:]:
+        try:
+            _apply_entry(cwm, line)
+        except (ValueError, KeyError, TypeError):
+            # Torn or malformed line: keep the prefix before it, and the whole original
+            # journal (including any lines after it) for manual recovery.
+            _preserve(path, "corrupt")
+            return applied, False
+        applied += 1
+    return applied, True
+
+
+def _preserve(path: Path, tag: str) -> None:
+    try:
+        path.replace(path.with_name(f"{path.name}.{tag}.{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"))
+    except Exception:
+        pass
+
+
+def _read_store() -> Tuple[Dict[str, List[Any]], int]:
+    path = _store_path()
     if not path.exists():
         cwm = _empty_strict()
-        _atomic_write_json(path, cwm)
-        return cwm
+        _write_snapshot(cwm)
+        return cwm, 0
 
     try:
-        raw = json.loads(path.read_text())
-        return _validate_strict(raw)
+        data = path.read_bytes()
+        cwm = _validate_strict(orjson.loads(data))
+        applied, usable = _replay_journal(cwm, _digest(data))
+        _validate_strict(cwm)
+        if not usable:
+            # Fold whatever was recoverable into a fresh snapshot + journal.
+            _write_snapshot(cwm)
+            applied = 0
+        return cwm, applied
     except Exception:
-        # Corrupt or invalid schema: preserve a backup and reset.
-        try:
-            backup = path.with_name(f"memory.json.corrupt.{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}")
-            path.replace(backup)
-        except Exception:
-            pass
+        # Corrupt or invalid schema: preserve a backup (the journal too, since the
+        # reset below overwrites it) and reset.
+        _preserve(path, "corrupt")
+        _preserve(_journal_path(), "corrupt")
 
         cwm = _empty_strict()
-        _atomic_write_json(path, cwm)
-        return cwm
+        _write_snapshot(cwm)
+        return cwm, 0
+
+
+def load_strict_cwm() -> Dict[str, List[Any]]:
+    global _cache, _journal_entries, _cache_stamp
+    with _lock:
+        cached = _cached_copy()
+        if cached is not None:
+            return cached
+        cwm, _journal_entries = _read_store()
+        _cache = cwm
+        _cache_stamp = _store_stamp()
+        return {k: list(v) for k, v in cwm.items()}
 
 
 def save_strict_cwm(cwm: Dict[str, List[Any]]) -> None:
+    global _cache, _journal_entries, _cache_stamp
     validated = _validate_strict(cwm)
-    _atomic_write_json(_store_path(), validated)
+    with _lock:
+        if _cache is None:
+            load_strict_cwm()
+        assert _cache is not None
+
+        # Per section: keep the common prefix with the last persisted state, append the rest.
+        diff = []
+        for k in STRICT_KEYS:
+            old, new = _cache[k], validated[k]
+            if old == new:
+                continue
+            keep = 0
+            limit = min(len(old), len(new))
+            while keep < limit and old[keep] == new[keep]:
+                keep += 1
+            diff.append([k, keep, new[keep:]])
+
+        # The journal only extends the state it was diffed against. If the files changed
+        # since our last load/save (another writer, a hand edit), appending would attach
+        # this save to a snapshot it was not diffed from and the next load would drop it,
+        # so write the full state instead (last writer wins).
+        stale = _cache_stamp != _store_stamp()
+        if diff or stale:
+            if stale or _journal_entries + 1 >= _COMPACT_EVERY or not _journal_path().exists():
+                _write_snapshot(validated)
+                _journal_entries = 0
+            else:
+                _append_journal(orjson.dumps({"d": diff}, option=orjson.OPT_NON_STR_KEYS) + b"\n")
+                _journal_entries += 1
+        _cache = {k: list(v) for k, v in validated.items()}
+        _cache_stamp = _store_stamp()
+
+
+# Async wrappers: disk I/O runs on the default thread pool so request handlers never
+# block the event loop. Reads of an unchanged store skip the thread hop entirely, unless
+# a save is in progress: then the read waits for it on a worker thread, not the loop.
+async def aload_strict_cwm() -> Dict[str, List[Any]]:
+    cached = _cached_copy(blocking=False)
+    if cached is not None:
+        return cached
+    return await asyncio.to_thread(load_strict_cwm)
+
+
+async def asave_strict_cwm(cwm: Dict[str, List[Any]]) -> None:
+    await asyncio.to_thread(save_strict_cwm, cwm)
 
 
 def _expand_for_runtime(strict_cwm: Dict[str, List[Any]]) -> Dict[str, Any]:
@@ -95,47 +298,33 @@ def _expand_for_runtime(strict_cwm: Dict[str, List[Any]]) -> Dict[str, Any]:
 
 
 def _derive_superseded(runtime_cwm: Dict[str, Any]) -> List[Dict[str, Any]]:
-    superseded: List[Dict[str, Any]] = []
-
-    def scan(section: str, items: Any) -> None:
-        if not isinstance(items, list):
-            return
-        for it in items:
-            if not isinstance(it, dict):
-                continue
-            if it.get("status") != "deprecated":
+    # Single pass; keyed by (section, from, to, key) so duplicates are dropped on insert
+    # and first-seen order is preserved.
+    out: Dict[tuple, Dict[str, Any]] = {}
+    for section in _SUPERSEDABLE_SECTIONS:
+        items = runtime_cwm.get(section)
+        if not items:
+            continue
+        try:
+            it_iter = iter(items)
+        except TypeError:
+            continue
+        # Duck-typed: anything without a .get (str, None, ...) is skipped; items are
+        # dicts in practice, so this is one attribute fetch instead of isinstance checks.
+        for it in it_iter:
+            get = getattr(it, "get", None)
+            if get is None or get("status") != "deprecated":
                 continue
-            to_ = it.get("superseded_by")
+            to_ = get("superseded_by")
             if not to_:
                 continue
-            from_ = it.get("id") or it.get("term")
-            superseded.append(
-                {
-                    "section": section,
-                    "from": from_,
-                    "to": to_,
-                    "key": it.get("key"),
-                }
-            )
-
-    scan("facts", runtime_cwm.get("facts"))
-    scan("decisions", runtime_cwm.get("decisions"))
-    scan("constraints", runtime_cwm.get("constraints"))
-    scan("definitions", runtime_cwm.get("definitions"))
-    scan("assumptions", runtime_cwm.get("assumptions"))
-    scan("open_loops", runtime_cwm.get("open_loops"))
-
-    # De-dupe
-    seen = set()
-    out: List[Dict[str, Any]] = []
-    for e in superseded:
-        k = (e.get("section"), e.get("from"), e.get("to"), e.get("key"))
-        if k in seen:
-            continue
-        seen.add(k)
-        out.append(e)
+            from_ = get("id") or get("term")
+            key = get("key")
+            k = (section, from_, to_, key)
+            if k not in out:
+                out[k] = {"section": section, "from": from_, "to": to_, "key": key}
 
-    return out
+    return list(out.values())
 
 
 def load_cwm_runtime() -> Dict[str, Any]:
@@ -143,13 +332,20 @@ def load_cwm_runtime() -> Dict[str, Any]:
     return _expand_for_runtime(strict)
 
 
+async def aload_cwm_runtime() -> Dict[str, Any]:
+    return _expand_for_runtime(await aload_strict_cwm())
+
+
 def save_cwm_from_runtime(runtime_cwm: Dict[str, Any]) -> Dict[str, List[Any]]:
-    strict: Dict[str, List[Any]] = {
-        "facts": list(runtime_cwm.get("facts", []) or []),
-        "decisions": list(runtime_cwm.get("decisions", []) or []),
-        "constraints": list(runtime_cwm.get("constraints", []) or []),
-        "open_loops": list(runtime_cwm.get("open_loops", []) or []),
-        "superseded": _derive_superseded(runtime_cwm),
-    }
+    strict: Dict[str, List[Any]] = {}
+    for k in ("facts", "decisions", "constraints", "open_loops"):
+        # Only copy when the runtime value is not already a list.
+        v = runtime_cwm.get(k) or []
+        strict[k] = v if type(v) is list else list(v)
+    strict["superseded"] = _derive_superseded(runtime_cwm)
     save_strict_cwm(strict)
     return strict
+
+
+async def asave_cwm_from_runtime(runtime_cwm: Dict[str, Any]) -> Dict[str, List[Any]]:
+    return await asyncio.to_thread(save_cwm_from_runtime, runtime_cwm)
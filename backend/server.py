@@ -1,22 +1,24 @@
 from __future__ import annotations
 
-import copy
 import logging
 import os
-import uuid
+import secrets
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+import orjson
+from bson import Decimal128, ObjectId
 from dotenv import load_dotenv
 from fastapi import APIRouter, FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 from starlette.middleware.cors import CORSMiddleware
 
 from engine import storage
 from engine.demo import run_demo
 from engine.orchestrator import force_compress, step
-from engine.schemas import MemoryResponse, RunCreateRequest, RunResponse, StepRequest, StepResponse
+from engine.schemas import MemoryResponse, RunConfig, RunCreateRequest, RunResponse, StepRequest, StepResponse
 
 
 ROOT_DIR = Path(__file__).parent
@@ -24,10 +26,40 @@ load_dotenv(ROOT_DIR / ".env")
 
 # MongoDB connection
 mongo_url = os.environ["MONGO_URL"]
-client = AsyncIOMotorClient(mongo_url)
+# Explicit pool: keep warm connections so early requests skip the handshake, and
+# compress wire traffic (event payloads are JSON-heavy). zlib needs no extra package.
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=50,
+    minPoolSize=10,
+    maxIdleTimeMS=60_000,
+    serverSelectionTimeoutMS=5_000,
+    retryWrites=True,
+    compressors="zlib",
+)
 db = client[os.environ["DB_NAME"]]
 
-app = FastAPI()
+
+def _json_default(obj: Any) -> Any:
+    # Only called for types orjson cannot encode itself (datetime is native), so raw
+    # Mongo documents go straight to the C encoder with no Python scrub walk. Anything
+    # that is not a known BSON scalar is a bug and fails loudly.
+    if isinstance(obj, (ObjectId, Decimal128)):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps_json(content: Any) -> bytes:
+    # Single encoder for every response, including raw Mongo documents.
+    return orjson.dumps(content, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+
+app = FastAPI(default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 
@@ -36,7 +68,33 @@ def now_iso() -> str:
 
 
 def new_run_id() -> str:
-    return f"run_{uuid.uuid4().hex[:12]}"
+    return f"run_{secrets.token_hex(6)}"
+
+
+def run_config_doc(
+    cfg: Optional[RunConfig],
+    compression_token_threshold: int,
+    compression_interval_steps: int,
+) -> Dict[str, Any]:
+    # Direct attribute reads; no model_dump() walk. Route-specific compression defaults
+    # apply only when no config is sent (RunConfig fields carry their own defaults).
+    if cfg is None:
+        return {
+            "stm_max_messages": 12,
+            "compression_token_threshold": compression_token_threshold,
+            "compression_interval_steps": compression_interval_steps,
+            "use_llm": True,
+            "llm_provider": "openai",
+            "llm_model": "gpt-5.2",
+        }
+    return {
+        "stm_max_messages": cfg.stm_max_messages,
+        "compression_token_threshold": cfg.compression_token_threshold,
+        "compression_interval_steps": cfg.compression_interval_steps,
+        "use_llm": cfg.use_llm,
+        "llm_provider": cfg.llm_provider,
+        "llm_model": cfg.llm_model,
+    }
 
 
 @api_router.get("/")
@@ -47,39 +105,31 @@ async def root():
 @api_router.post("/runs", response_model=RunResponse)
 async def create_run(req: RunCreateRequest):
     run_id = new_run_id()
-    config = (req.config.model_dump() if req.config else {})
+    ts = now_iso()
 
     run_doc = {
         "run_id": run_id,
         "objective": req.objective,
         "scenario": req.scenario,
-        "created_at": now_iso(),
-        "updated_at": now_iso(),
+        "created_at": ts,
+        "updated_at": ts,
         "step_index": 0,
-        "config": {
-            "stm_max_messages": config.get("stm_max_messages", 12),
-            "compression_token_threshold": config.get("compression_token_threshold", 2400),
-            "compression_interval_steps": config.get("compression_interval_steps", 4),
-            "use_llm": config.get("use_llm", True),
-            "llm_provider": config.get("llm_provider", "openai"),
-            "llm_model": config.get("llm_model", "gpt-5.2"),
-        },
+        "running_chars": 0,
+        "config": run_config_doc(req.config, compression_token_threshold=2400, compression_interval_steps=4),
     }
 
-    # IMPORTANT: Mongo may add an ObjectId _id field to the inserted dict in-place.
-    # We snapshot a deep copy for event payload to keep the event JSON-serializable.
-    run_doc_for_event = copy.deepcopy(run_doc)
-
-    await storage.create_run(db, run_doc)
-    await storage.insert_event(
+    await storage.create_run_with_event(
         db,
+        run_doc,
         {
-            "id": f"evt_{uuid.uuid4().hex[:12]}",
+            "id": f"evt_{secrets.token_hex(6)}",
             "run_id": run_id,
             "step_index": 0,
-            "ts": now_iso(),
+            "ts": ts,
             "type": "run_created",
-            "payload": {"run": run_doc_for_event},
+            # Inserts use copies, so run_doc never gains an ObjectId _id and can be
+            # embedded in the event payload directly.
+            "payload": {"run": run_doc},
         },
     )
 
@@ -133,16 +183,15 @@ async def compress_run(run_id: str):
 
 @api_router.get("/runs/{run_id}/memory", response_model=MemoryResponse)
 async def get_memory(run_id: str):
-    run = await storage.get_run(db, run_id)
-    if not run:
+    cfg = await storage.get_run_config(db, run_id)
+    if cfg is None:
         raise HTTPException(status_code=404, detail="run not found")
 
-    cfg = run.get("config", {})
     stm = await storage.list_stm_tail(db, run_id, limit=int(cfg.get("stm_max_messages", 12)))
     # Disk-backed CWM is the source of truth
-    from memory_store import load_cwm_runtime
+    from memory_store import aload_cwm_runtime
 
-    cwm = load_cwm_runtime()
+    cwm = await aload_cwm_runtime()
     ltm = await storage.get_latest_ltm(db, run_id)
     metrics = await storage.get_metrics(db, run_id)
 
@@ -150,17 +199,35 @@ async def get_memory(run_id: str):
 
 
 @api_router.get("/runs/{run_id}/events")
-async def get_events(run_id: str):
-    run = await storage.get_run(db, run_id)
-    if not run:
+async def get_events(run_id: str, include_payload: bool = True):
+    if await storage.get_run_config(db, run_id) is None:
         raise HTTPException(status_code=404, detail="run not found")
-    events = await storage.list_events(db, run_id, limit=800)
-    return {"run_id": run_id, "events": events}
+    # ?include_payload=0 returns timeline fields only; fetch payloads per event below.
+    projection = None if include_payload else storage.EVENT_SUMMARY_PROJECTION
+
+    async def body():
+        # Same document as {"run_id": ..., "events": [...]}, emitted one event at a time.
+        yield b'{"run_id":' + dumps_json(run_id) + b',"events":['
+        first = True
+        async for evt in storage.iter_events(db, run_id, limit=800, projection=projection):
+            yield (b"" if first else b",") + dumps_json(evt)
+            first = False
+        yield b"]}"
+
+    return StreamingResponse(body(), media_type="application/json")
+
+
+@api_router.get("/runs/{run_id}/events/{event_id}")
+async def get_event(run_id: str, event_id: str):
+    evt = await storage.get_event(db, run_id, event_id)
+    if not evt:
+        raise HTTPException(status_code=404, detail="event not found")
+    return ORJSONResponse(evt)
 
 
 @api_router.get("/runs/{run_id}/snapshots/latest")
 async def get_latest_snapshot(run_id: str):
-    snap = storage.read_latest_snapshot(run_id)
+    snap = await storage.read_latest_snapshot(run_id)
     if not snap:
         raise HTTPException(status_code=404, detail="no snapshot")
     return snap
@@ -169,23 +236,17 @@ async def get_latest_snapshot(run_id: str):
 @api_router.post("/demo/run")
 async def demo_run(req: RunCreateRequest):
     run_id = new_run_id()
-    config = (req.config.model_dump() if req.config else {})
+    ts = now_iso()
 
     run_doc = {
         "run_id": run_id,
         "objective": req.objective,
         "scenario": req.scenario,
-        "created_at": now_iso(),
-        "updated_at": now_iso(),
+        "created_at": ts,
+        "updated_at": ts,
         "step_index": 0,
-        "config": {
-            "stm_max_messages": config.get("stm_max_messages", 12),
-            "compression_token_threshold": config.get("compression_token_threshold", 1800),
-            "compression_interval_steps": config.get("compression_interval_steps", 2),
-            "use_llm": config.get("use_llm", True),
-            "llm_provider": config.get("llm_provider", "openai"),
-            "llm_model": config.get("llm_model", "gpt-5.2"),
-        },
+        "running_chars": 0,
+        "config": run_config_doc(req.config, compression_token_threshold=1800, compression_interval_steps=2),
     }
 
     await storage.create_run(db, run_doc)
@@ -210,6 +271,11 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+@app.on_event("startup")
+async def ensure_db_indexes():
+    await storage.ensure_indexes(db)
+
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
\ No newline at end of file
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import sys
 import time
@@ -14,6 +15,9 @@ class ContextDistilleryTester:
         self.tests_run = 0
         self.tests_passed = 0
         self.current_run_id = None
+        # One keep-alive session for the whole suite instead of a new TLS handshake per call.
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=10))
 
     def log(self, message: str):
         print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
@@ -28,9 +32,9 @@ class ContextDistilleryTester:
         
         try:
             if method == 'GET':
-                response = requests.get(url, headers=headers, timeout=30)
+                response = self.session.get(url, headers=headers, timeout=30)
             elif method == 'POST':
-                response = requests.post(url, json=data, headers=headers, timeout=30)
+                response = self.session.post(url, json=data, headers=headers, timeout=30)
             else:
                 raise ValueError(f"Unsupported method: {method}")
 
@@ -5,6 +5,10 @@ import json
 import sys
 from datetime import datetime
 
+# Shared keep-alive session so the calls below reuse one connection.
+_SESSION = requests.Session()
+
+
 def test_events_serialization():
     """Test that events endpoint returns proper JSON without ObjectId serialization issues"""
     
@@ -17,7 +21,7 @@ def test_events_serialization():
     try:
         # Step 1: Create a run
         print("\n1️⃣ Creating test run...")
-        create_response = requests.post(f"{api_url}/runs", json={
+        create_response = _SESSION.post(f"{api_url}/runs", json={
             "objective": "Test events serialization",
             "scenario": "C",
             "config": {
@@ -38,7 +42,7 @@ def test_events_serialization():
         
         # Step 2: Send a step to generate events
         print("\n2️⃣ Sending step to generate events...")
-        step_response = requests.post(f"{api_url}/runs/{run_id}/step", json={
+        step_response = _SESSION.post(f"{api_url}/runs/{run_id}/step", json={
             "user_message": "Test message to generate events"
         }, timeout=30)
         
@@ -50,7 +54,7 @@ def test_events_serialization():
         
         # Step 3: Test events endpoint
         print("\n3️⃣ Testing events endpoint...")
-        events_response = requests.get(f"{api_url}/runs/{run_id}/events", timeout=30)
+        events_response = _SESSION.get(f"{api_url}/runs/{run_id}/events", timeout=30)
         
         if events_response.status_code != 200:
             print(f"❌ Events endpoint failed: {events_response.status_code}")
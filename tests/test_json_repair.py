@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from engine._json import loads_loose
+from engine._json_repair import repair_json
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        # chatter and fences around the value
+        ('Here is your JSON: {"a": 1} hope it helps', {"a": 1}),
+        ('```json\n{"a": [1, 2]}\n```', {"a": [1, 2]}),
+        # a bracket in leading chatter must not be taken as the value
+        ('Note [1]: {"a": 1}', {"a": 1}),
+        ("See [docs] first.\n```json\n{\"a\": [1]}\n```", {"a": [1]}),
+        # trailing commas
+        ('{"a": [1, 2,], "b": 3,}', {"a": [1, 2], "b": 3}),
+        # truncation: unterminated string, unclosed brackets
+        ('{"a": "hel', {"a": "hel"}),
+        ('{"a": [1, 2', {"a": [1, 2]}),
+        ('{"a": {"b": [', {"a": {"b": []}}),
+        # truncation: dangling comma / colon / bare key
+        ('{"a": 1,', {"a": 1}),
+        ('{"a": 1, "b":', {"a": 1, "b": None}),
+        ('{"a": 1, "b"', {"a": 1}),
+        # truncation: partial literals and numbers
+        ('{"a": tr', {"a": True}),
+        ('{"a": nul', {"a": None}),
+        ('{"a": 1.', {"a": 1}),
+        # escapes inside strings, including a truncated one
+        ('{"a": "x\\"}y"}', {"a": 'x"}y'}),
+        ('{"a": "x\\', {"a": "x"}),
+    ],
+)
+def test_repair_json(text, expected):
+    assert json.loads(repair_json(text)) == expected
+
+
+def test_repair_json_array_only_without_object():
+    assert json.loads(repair_json("values: [1, 2,]")) == [1, 2]
+
+
+def test_repair_json_stray_closer_is_ignored():
+    assert json.loads(repair_json('{"a": 1]}')) == {"a": 1}
+
+
+def test_loads_loose_prefers_strict_parse():
+    assert loads_loose('{"a": [1]}') == {"a": [1]}
+    assert loads_loose('Note [1]: {"a": 1}') == {"a": 1}
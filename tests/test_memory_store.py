@@ -0,0 +1,205 @@
+import asyncio
+import threading
+
+import orjson
+import pytest
+
+import memory_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_store, "_project_root", lambda: tmp_path)
+    monkeypatch.setattr(memory_store, "_cache", None)
+    monkeypatch.setattr(memory_store, "_cache_stamp", None)
+    monkeypatch.setattr(memory_store, "_journal_entries", 0)
+    return tmp_path / ".macrador"
+
+
+def _fact(i):
+    return {"id": f"f{i}", "text": f"fact {i}"}
+
+
+def _reload():
+    # Drop the process-local cache so the next load reads the files.
+    memory_store._cache = None
+    memory_store._cache_stamp = None
+    return memory_store.load_strict_cwm()
+
+
+def _save_facts(n, start=0):
+    for i in range(start, start + n):
+        cwm = memory_store.load_strict_cwm()
+        cwm["facts"].append(_fact(i))
+        memory_store.save_strict_cwm(cwm)
+
+
+def test_saves_are_journaled_and_replayed(store):
+    _save_facts(3)
+
+    snapshot = orjson.loads((store / "memory.json").read_bytes())
+    journal = (store / "memory.journal").read_bytes().splitlines()
+    assert snapshot["facts"] == []  # saves went to the journal, not the snapshot
+    assert len(journal) == 1 + 3
+
+    assert _reload()["facts"] == [_fact(0), _fact(1), _fact(2)]
+
+
+def test_replace_and_truncate_are_replayed(store):
+    _save_facts(3)
+    cwm = memory_store.load_strict_cwm()
+    cwm["facts"] = [cwm["facts"][0], _fact(9)]
+    cwm["decisions"] = [{"id": "d1"}]
+    memory_store.save_strict_cwm(cwm)
+
+    assert _reload() == {**memory_store._empty_strict(), "facts": [_fact(0), _fact(9)], "decisions": [{"id": "d1"}]}
+
+
+def test_compaction_rewrites_snapshot(store):
+    _save_facts(memory_store._COMPACT_EVERY)
+
+    snapshot = orjson.loads((store / "memory.json").read_bytes())
+    assert len(snapshot["facts"]) == memory_store._COMPACT_EVERY
+    assert len((store / "memory.journal").read_bytes().splitlines()) == 1
+    assert len(_reload()["facts"]) == memory_store._COMPACT_EVERY
+
+
+def test_torn_last_journal_line_is_dropped(store):
+    _save_facts(2)
+    with open(store / "memory.journal", "ab") as f:
+        f.write(b'{"d": [["facts", 2, [{"id": "f')
+
+    assert _reload()["facts"] == [_fact(0), _fact(1)]
+    # The recovered state was folded into a fresh snapshot; later saves append cleanly.
+    assert orjson.loads((store / "memory.json").read_bytes())["facts"] == [_fact(0), _fact(1)]
+    _save_facts(1, start=2)
+    assert _reload()["facts"] == [_fact(0), _fact(1), _fact(2)]
+
+
+@pytest.mark.parametrize(
+    "bad_line",
+    [
+        b'{"d": [["definitions", 0, []]]}',  # parses, but not a strict section
+        b'{"d": [["facts", "1", []]]}',  # keep is not an int
+        b'{"d": [["facts", 0, "x"]]}',  # added is not a list
+        b'{"d": [["facts", 0]]}',  # wrong arity
+        b'[1, 2]',  # not an entry at all
+    ],
+)
+def test_malformed_journal_line_keeps_journaled_saves(store, bad_line):
+    _save_facts(3)
+    with open(store / "memory.journal", "ab") as f:
+        f.write(bad_line + b"\n")
+
+    assert _reload()["facts"] == [_fact(0), _fact(1), _fact(2)]
+    assert len(list(store.glob("memory.journal.corrupt.*"))) == 1
+    assert not list(store.glob("memory.json.corrupt.*"))
+
+
+def test_bad_line_mid_journal_stops_replay_and_preserves_the_rest(store):
+    _save_facts(2)
+    journal = store / "memory.journal"
+    lines = journal.read_bytes().splitlines()
+    later = orjson.dumps({"d": [["facts", 2, [_fact(2)]]]})
+    journal.write_bytes(b"\n".join(lines + [b'{"d": [["facts", 2, [{"id"', later]) + b"\n")
+
+    assert _reload()["facts"] == [_fact(0), _fact(1)]
+    (preserved,) = store.glob("memory.journal.corrupt.*")
+    assert preserved.read_bytes().splitlines()[-1] == later
+
+
+def test_corrupt_snapshot_also_preserves_journal(store):
+    _save_facts(2)
+    (store / "memory.json").write_bytes(b"{not json")
+
+    assert _reload() == memory_store._empty_strict()
+    (preserved,) = store.glob("memory.journal.corrupt.*")
+    assert len(preserved.read_bytes().splitlines()) == 1 + 2
+
+
+def test_journal_with_stale_base_is_set_aside(store):
+    _save_facts(2)
+    # memory.json replaced without its journal (e.g. edited by hand).
+    edited = {**memory_store._empty_strict(), "decisions": [{"id": "d_manual"}]}
+    (store / "memory.json").write_bytes(orjson.dumps(edited))
+
+    assert _reload() == edited
+    assert len(list(store.glob("memory.journal.orphaned.*"))) == 1
+
+
+def test_save_after_external_change_is_not_lost(store):
+    memory_store.load_strict_cwm()
+    _save_facts(1)
+    cwm = memory_store.load_strict_cwm()
+
+    # Another writer replaces memory.json between our load and save.
+    (store / "memory.json").write_bytes(orjson.dumps({**memory_store._empty_strict(), "facts": [_fact(7)]}))
+
+    cwm["facts"].append({"id": "f_saved"})
+    memory_store.save_strict_cwm(cwm)
+
+    assert _reload()["facts"] == [_fact(0), {"id": "f_saved"}]
+
+
+def test_corrupt_snapshot_is_backed_up_and_reset(store):
+    _save_facts(1)
+    (store / "memory.json").write_bytes(b"{not json")
+
+    assert _reload() == memory_store._empty_strict()
+    assert len(list(store.glob("memory.json.corrupt.*"))) == 1
+
+
+def test_async_load_does_not_block_the_loop_during_a_save(store):
+    _save_facts(1)
+    held, release = threading.Event(), threading.Event()
+
+    def saver():
+        # Stands in for a save that is mid-write while holding the store lock.
+        with memory_store._lock:
+            held.set()
+            release.wait(5)
+
+    t = threading.Thread(target=saver)
+    t.start()
+    held.wait(5)
+
+    async def main():
+        load = asyncio.ensure_future(memory_store.aload_strict_cwm())
+        await asyncio.sleep(0.05)  # the loop keeps running while the lock is held
+        assert not load.done()
+        release.set()
+        return await asyncio.wait_for(load, 5)
+
+    try:
+        assert asyncio.run(main())["facts"] == [_fact(0)]
+    finally:
+        release.set()
+        t.join()
+
+
+def test_derive_superseded_dedupes_in_first_seen_order():
+    runtime = {
+        "decisions": [
+            {"id": "d1", "key": "db", "status": "deprecated", "superseded_by": "d2"},
+            {"id": "d2", "key": "db", "status": "active"},
+            {"id": "d1", "key": "db", "status": "deprecated", "superseded_by": "d2"},
+        ],
+        "definitions": [{"term": "STM", "status": "deprecated", "superseded_by": "STM2"}],
+        "facts": [{"id": "f1", "status": "deprecated", "superseded_by": None}],
+    }
+    assert memory_store._derive_superseded(runtime) == [
+        {"section": "decisions", "from": "d1", "to": "d2", "key": "db"},
+        {"section": "definitions", "from": "STM", "to": "STM2", "key": None},
+    ]
+
+
+def test_derive_superseded_skips_malformed_sections_and_items():
+    runtime = {
+        "constraints": 5,
+        "facts": "not a list",
+        "decisions": [None, "x", {"id": "d1", "status": "deprecated", "superseded_by": "d2"}],
+        "open_loops": None,
+    }
+    assert memory_store._derive_superseded(runtime) == [
+        {"section": "decisions", "from": "d1", "to": "d2", "key": None}
+    ]
@@ -0,0 +1,58 @@
+from engine.retrieval_agent import _FALLBACK_MAX_PICKS, _fallback_retrieve
+
+
+def _item(i, text, **extra):
+    return {"id": i, "text": text, "status": "active", **extra}
+
+
+def test_no_cwm_returns_empty_selection():
+    out = _fallback_retrieve("objective", "message", None)
+    assert out["notes"] == "fallback keyword retrieval"
+    assert all(out[k] == [] for k in out if k != "notes")
+
+
+def test_matches_whole_words_only():
+    cwm = {"facts": [_item("f1", "Capital planning"), _item("f2", "The API returns JSON")]}
+    out = _fallback_retrieve("", "design the api", cwm)
+    assert out["facts_ids"] == ["f2"]
+
+
+def test_skips_deprecated_and_empty_items():
+    cwm = {
+        "decisions": [
+            _item("d1", "use mongo", status="deprecated"),
+            _item("d2", ""),
+            _item("d3", "use mongo for storage"),
+        ]
+    }
+    assert _fallback_retrieve("", "mongo", cwm)["decisions_ids"] == ["d3"]
+
+
+def test_definitions_match_on_definition_text_and_return_terms():
+    cwm = {"definitions": [{"term": "CWM", "definition": "compressed working memory", "status": "active"}]}
+    assert _fallback_retrieve("", "working memory", cwm)["definitions_terms"] == ["CWM"]
+
+
+def test_keeps_top_picks_by_overlap():
+    facts = [_item(f"low{i}", "alpha") for i in range(_FALLBACK_MAX_PICKS)]
+    facts.append(_item("high", "alpha beta gamma"))
+    out = _fallback_retrieve("", "alpha beta gamma", {"facts": facts})
+    assert len(out["facts_ids"]) == _FALLBACK_MAX_PICKS
+    assert out["facts_ids"][0] == "high"
+    assert out["facts_ids"][1:] == [f"low{i}" for i in range(_FALLBACK_MAX_PICKS - 1)]
+
+
+def test_ties_keep_section_then_item_order():
+    cwm = {
+        "facts": [_item("f1", "shared"), _item("f2", "shared")],
+        "constraints": [_item("c1", "shared")],
+    }
+    out = _fallback_retrieve("", "shared", cwm)
+    assert out["constraints_ids"] == ["c1"]
+    assert out["facts_ids"] == ["f1", "f2"]
+
+
+def test_only_first_twenty_query_words_count():
+    query = " ".join(f"w{i}" for i in range(20)) + " late"
+    cwm = {"facts": [_item("early", "w3"), _item("late", "late")]}
+    assert _fallback_retrieve("", query, cwm)["facts_ids"] == ["early"]
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from engine import storage
+
+
+class _FakeRuns:
+    def __init__(self, docs):
+        self.docs = docs
+        self.reads = 0
+
+    async def find_one(self, query, projection):
+        self.reads += 1
+        return self.docs.get(query["run_id"])
+
+
+class _FakeDb:
+    def __init__(self, docs):
+        self.runs = _FakeRuns(docs)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(storage.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(storage, "_RUN_CONFIG_CACHE", {})
+    return now
+
+
+def test_run_config_is_served_from_cache_within_ttl(clock):
+    db = _FakeDb({"r1": {"run_id": "r1", "config": {"use_llm": False}}})
+    assert asyncio.run(storage.get_run_config(db, "r1")) == {"use_llm": False}
+    clock[0] += storage._RUN_CONFIG_TTL_S / 2
+    assert asyncio.run(storage.get_run_config(db, "r1")) == {"use_llm": False}
+    assert db.runs.reads == 1
+
+
+def test_expired_hit_is_dropped_and_reread(clock):
+    db = _FakeDb({"r1": {"run_id": "r1", "config": {}}})
+    asyncio.run(storage.get_run_config(db, "r1"))
+    clock[0] += storage._RUN_CONFIG_TTL_S + 1
+    del db.runs.docs["r1"]
+    assert asyncio.run(storage.get_run_config(db, "r1")) is None
+    assert "r1" not in storage._RUN_CONFIG_CACHE
+
+
+def test_remember_prunes_expired_entries(clock):
+    storage._remember_config({"run_id": "old", "config": {}})
+    clock[0] += storage._RUN_CONFIG_TTL_S + 1
+    storage._remember_config({"run_id": "new", "config": {}})
+    assert list(storage._RUN_CONFIG_CACHE) == ["new"]
+
+
+def test_remember_caps_the_cache(clock, monkeypatch):
+    monkeypatch.setattr(storage, "_RUN_CONFIG_CACHE_MAX", 3)
+    for i in range(5):
+        storage._remember_config({"run_id": f"r{i}", "config": {}})
+    assert list(storage._RUN_CONFIG_CACHE) == ["r2", "r3", "r4"]
+
+
+def test_remember_refreshes_recency(clock, monkeypatch):
+    monkeypatch.setattr(storage, "_RUN_CONFIG_CACHE_MAX", 2)
+    storage._remember_config({"run_id": "a", "config": {}})
+    storage._remember_config({"run_id": "b", "config": {}})
+    storage._remember_config({"run_id": "a", "config": {}})
+    storage._remember_config({"run_id": "c", "config": {}})
+    assert list(storage._RUN_CONFIG_CACHE) == ["a", "c"]
@@ -0,0 +1,53 @@
+import pytest
+
+from engine.orchestrator import _joined_parts, _message_chars, _transcript_parts, should_compress
+from engine.token_utils import estimate_tokens, estimate_tokens_from_length, estimate_tokens_from_parts
+
+MESSAGES = [
+    {"role": "user", "content": "hello"},
+    {"role": "assistant", "content": "hi there, how can I help?"},
+    {"role": "user", "content": ""},
+    {"role": "assistant", "content": "ünïcode ✓"},
+]
+
+
+@pytest.mark.parametrize("text", ["", "a", "abcd", "abcde", "x" * 401])
+def test_estimate_from_length_matches_estimate_tokens(text):
+    assert estimate_tokens_from_length(len(text)) == estimate_tokens(text)
+    assert estimate_tokens_from_parts([text[:2], text[2:]]) == estimate_tokens(text)
+
+
+def test_transcript_parts_match_the_joined_blob():
+    blob = "\n".join(m["role"] + ":" + m["content"] for m in MESSAGES)
+    assert "".join(_transcript_parts(MESSAGES)) == blob
+    assert list(_transcript_parts([])) == []
+
+
+def test_joined_parts_match_str_join():
+    texts = ["a", "", "bc"]
+    assert "".join(_joined_parts(texts)) == "\n".join(texts)
+    assert "".join(_joined_parts(texts, sep=", ")) == ", ".join(texts)
+
+
+def test_running_chars_match_the_baseline_blob():
+    # step() keeps len(objective) + sum(_message_chars) instead of building this blob.
+    objective = "Build a context compression engine"
+    blob = objective + "\n" + "\n".join(m["role"] + ":" + m["content"] for m in MESSAGES)
+    running = sum(_message_chars(m["role"], m["content"]) for m in MESSAGES)
+    assert len(objective) + running == len(blob)
+    assert estimate_tokens_from_length(len(objective) + running) == estimate_tokens(blob)
+
+
+@pytest.mark.parametrize(
+    "config, step_index, baseline_tokens, expected",
+    [
+        ({}, 1, 100, False),
+        ({}, 4, 100, True),  # default interval 4
+        ({}, 3, 2400, True),  # default threshold 2400
+        ({"compression_interval_steps": 0}, 4, 100, False),
+        ({"compression_interval_steps": 2}, 0, 100, False),
+        ({"compression_token_threshold": 50, "compression_interval_steps": 0}, 1, 50, True),
+    ],
+)
+def test_should_compress(config, step_index, baseline_tokens, expected):
+    assert should_compress(config, step_index, baseline_tokens) is expected
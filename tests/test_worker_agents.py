@@ -0,0 +1,73 @@
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+from engine import worker_agents
+from engine.llm_client import LlmSettings
+
+
+class _FakeLlm:
+    # Stands in for LlmClient: same settings/ask interface, canned replies.
+    def __init__(self):
+        self.settings = LlmSettings()
+        self.calls = []
+
+    async def ask(self, agent_role, system_message, user_text):
+        self.calls.append(user_text)
+        return '{"assistant_message": "reply %d"}' % len(self.calls)
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(worker_agents, "_PLANNER_CACHE", OrderedDict())
+    monkeypatch.setattr(worker_agents, "_CRITIC_CACHE", OrderedDict())
+
+
+def _tail(step, content="hi"):
+    return [{"role": "user", "content": content, "message_id": f"m{step}", "run_id": "r", "step_index": step, "ts": str(step)}]
+
+
+def _plan(llm, tail, message="hi"):
+    return asyncio.run(worker_agents.run_planner(llm, "objective", [], tail, message))
+
+
+def test_same_content_at_different_steps_hits():
+    llm = _FakeLlm()
+    assert _plan(llm, _tail(1)) == _plan(llm, _tail(2))
+    assert len(llm.calls) == 1
+    assert '"message_id"' not in llm.calls[0] and '"step_index"' not in llm.calls[0]
+
+
+def test_different_content_misses():
+    llm = _FakeLlm()
+    _plan(llm, _tail(1, "hi"))
+    _plan(llm, _tail(1, "bye"))
+    assert len(llm.calls) == 2
+
+
+def test_hits_return_independent_copies():
+    llm = _FakeLlm()
+    _plan(llm, _tail(1))["assistant_message"] = "mutated"
+    assert _plan(llm, _tail(1)) == {"assistant_message": "reply 1"}
+
+
+def test_least_recently_used_reply_is_evicted(monkeypatch):
+    monkeypatch.setattr(worker_agents, "_REPLY_CACHE_MAX", 2)
+    llm = _FakeLlm()
+    _plan(llm, _tail(1, "a"))
+    _plan(llm, _tail(1, "b"))
+    _plan(llm, _tail(1, "a"))  # hit: "a" becomes most recent
+    _plan(llm, _tail(1, "c"))  # evicts "b"
+    assert len(llm.calls) == 3
+    _plan(llm, _tail(1, "a"))
+    assert len(llm.calls) == 3
+    _plan(llm, _tail(1, "b"))
+    assert len(llm.calls) == 4
+
+
+def test_planner_and_critic_caches_are_separate():
+    llm = _FakeLlm()
+    _plan(llm, _tail(1))
+    asyncio.run(worker_agents.run_critic(llm, "objective", [], _tail(1), "hi", {"assistant_message": "reply 1"}))
+    assert len(llm.calls) == 2